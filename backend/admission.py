@@ -0,0 +1,119 @@
+import pandas as pd
+import io
+from typing import Dict, Any, Tuple, Optional, List, Set
+
+from backend.utils.config import Config
+
+
+class AdmissionControl:
+    """
+    Control de admisión de archivos subidos
+
+    Estima la memoria que ocuparía el archivo parseado a partir de una muestra de
+    filas (sin leerlo entero) y decide cómo procesarlo:
+        - 'completo': cabe en el presupuesto, se carga en memoria como siempre
+        - 'acotado':  no cabe; se vuelca por lotes a Parquet y se entrena con muestras
+        - 'rechazado': ni siquiera el modo acotado es viable
+    """
+
+    @staticmethod
+    def _sample(uploaded_file, data: bytes, hojas: Optional[List[str]] = None) -> Tuple[pd.DataFrame, int, Set[str]]:
+        """
+        Primeras filas del archivo, número total de filas estimado y columnas comunes
+
+        En libros Excel se suman todas las hojas seleccionadas (la primera si no hay selección)
+        y las columnas son las presentes en todas ellas.
+        """
+        n = Config.ADMISSION_SAMPLE_ROWS
+
+        def _columnas(df: pd.DataFrame) -> Set[str]:
+            return {str(c).strip().lower() for c in df.columns}
+
+        if uploaded_file.name.endswith('.csv'):
+            muestra = pd.read_csv(io.BytesIO(data), nrows=n)
+            # Bytes ocupados por la cabecera + n filas de muestra -> filas totales
+            fin_muestra = 0
+            for _ in range(len(muestra) + 1):
+                fin_muestra = data.find(b'\n', fin_muestra) + 1
+                if fin_muestra == 0:
+                    return muestra, len(muestra), _columnas(muestra)
+            bytes_por_fila = fin_muestra / max(len(muestra) + 1, 1)
+            return muestra, int(len(data) / bytes_por_fila), _columnas(muestra)
+
+        if uploaded_file.name.endswith('.xlsx'):
+            import openpyxl
+
+            wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+            try:
+                muestras, total, columnas = [], 0, None
+                for ws in ([wb[h] for h in hojas] if hojas else wb.worksheets[:1]):
+                    filas = ws.iter_rows(values_only=True, max_row=n + 1)
+                    cabecera = [str(c) for c in next(filas, ())]
+                    muestra = pd.DataFrame.from_records(list(filas), columns=cabecera or None)
+                    # La dimensión declarada en el libro da el total sin recorrer las filas
+                    total += max(ws.max_row - 1 if ws.max_row else len(muestra), len(muestra))
+                    columnas = _columnas(muestra) if columnas is None else columnas & _columnas(muestra)
+                    muestras.append(muestra)
+            finally:
+                wb.close()
+            return pd.concat(muestras, ignore_index=True), total, columnas
+
+        # .xls: sin dimensión barata; se extrapola desde el tamaño (~50 bytes por fila)
+        muestras = pd.read_excel(io.BytesIO(data), nrows=n, sheet_name=hojas or [0])
+        columnas = set.intersection(*(_columnas(m) for m in muestras.values()))
+        muestra = pd.concat(muestras.values(), ignore_index=True)
+        completas = all(len(m) < n for m in muestras.values())
+        return muestra, len(muestra) if completas else int(len(data) / 50), columnas
+
+    @staticmethod
+    def assess(uploaded_file, hojas: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Evalúa un archivo subido antes de parsearlo completo
+
+        Args:
+            uploaded_file: Archivo subido
+            hojas: Hojas de Excel seleccionadas (None = la primera)
+
+        Returns:
+            Dict con 'decision', 'motivo', 'filas_estimadas', 'memoria_mb' y 'tamaño_mb'
+        """
+        data = uploaded_file.getvalue()
+        tamaño_mb = len(data) / 1024 ** 2
+        presupuesto_mb = Config.MEMORY_BUDGET_MB
+
+        evaluacion = {'tamaño_mb': tamaño_mb, 'filas_estimadas': None, 'memoria_mb': None}
+
+        # El archivo subido ya ocupa memoria; el modo acotado necesita al menos ese margen
+        if tamaño_mb > presupuesto_mb / 2:
+            evaluacion.update(decision='rechazado',
+                              motivo=f"Archivo de {tamaño_mb:.0f} MB excede el presupuesto de memoria ({presupuesto_mb} MB)")
+            return evaluacion
+
+        try:
+            muestra, filas, columnas = AdmissionControl._sample(uploaded_file, data, hojas)
+        except Exception as e:
+            # Sin muestra no hay estimación: los archivos pequeños siguen la carga normal (con su fallback)
+            if len(data) <= Config.MAX_FILE_SIZE:
+                evaluacion.update(decision='completo', motivo=f"Sin estimación de memoria ({e})")
+            else:
+                evaluacion.update(decision='rechazado', motivo=f"No se pudo leer una muestra del archivo: {e}")
+            return evaluacion
+
+        bytes_por_fila = muestra.memory_usage(deep=True, index=False).sum() / max(len(muestra), 1)
+        memoria_mb = float(filas * bytes_por_fila * Config.PROCESSING_MEMORY_FACTOR / 1024 ** 2)
+        evaluacion.update(filas_estimadas=filas, memoria_mb=memoria_mb)
+
+        if memoria_mb + tamaño_mb <= presupuesto_mb and len(data) <= Config.MAX_FILE_SIZE \
+                and filas <= Config.OOC_MAX_ROWS_IN_MEMORY:
+            evaluacion.update(decision='completo', motivo="Cabe en el presupuesto de memoria")
+            return evaluacion
+
+        if not set(Config.EXCEL_COLUMNS_REQUIRED) <= columnas or uploaded_file.name.endswith('.xls'):
+            evaluacion.update(decision='rechazado',
+                              motivo=f"~{memoria_mb:.0f} MB estimados y el archivo no admite lectura por lotes "
+                                     f"(se requiere .csv/.xlsx con columnas {Config.EXCEL_COLUMNS_REQUIRED})")
+            return evaluacion
+
+        evaluacion.update(decision='acotado',
+                          motivo=f"~{memoria_mb:.0f} MB estimados para {filas:,} filas - se procesa por lotes en disco")
+        return evaluacion
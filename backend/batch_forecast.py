@@ -0,0 +1,181 @@
+"""
+Lote nocturno de predicciones
+
+Recorre todos los datasets registrados en shared_data/datasets/, ejecuta
+MLPredictor sobre cada artículo y materializa el resultado en shared_data/forecasts/
+(los bosques compactos de cada artículo quedan en shared_data/models/<dataset>/<run_id>/).
+
+Uso:
+    python -m backend.batch_forecast                 # todos los datasets
+    python -m backend.batch_forecast --dataset ventas
+"""
+import argparse
+
+import backend.utils.headless  # antes que los módulos del backend
+
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Dict
+
+from backend.ml_predictor import MLPredictor
+from backend.intermittent import IntermittentForecaster
+from backend.forecast_store import ForecastStore
+from backend.model_tuning import ModelTuner
+from backend.out_of_core import OutOfCoreTrainer
+from backend.utils.config import Config
+
+
+def _forecast_table(articulo: str, resultado: Dict, firma: str) -> pd.DataFrame:
+    """Filas del almacén para la predicción de un artículo"""
+    tabla = pd.DataFrame({
+        'articulo': str(articulo),
+        'fecha': resultado['fechas_futuras'],
+        'paso': range(1, len(resultado['predicciones']) + 1),
+        'prediccion': resultado['predicciones'],
+        'modelo_info': resultado['modelo_info'],
+        'firma': firma
+    })
+    for q in MLPredictor.PERCENTILES_ARBOLES:
+        tabla[f"arboles_p{round(q * 100)}"] = resultado['dispersion_arboles'].get(q, np.nan)
+    return tabla
+
+
+def _save_compact(directorio: str, articulo: str, resultado: Dict, firma: str, registro: Dict) -> None:
+    """Guarda el bosque compacto del artículo en el directorio de la ejecución y lo anota en el registro"""
+    clave_articulo = ForecastStore.article_key(articulo)
+    resultado['modelo_compacto'].save(os.path.join(directorio, clave_articulo))
+    registro[str(articulo)] = {'clave': clave_articulo, 'firma': firma}
+
+
+def _write_run(clave: str, horizonte: int, tablas: List[pd.DataFrame], modelos: Dict,
+               compactos: Dict, directorio: str) -> Optional[str]:
+    """Publica la ejecución (predicciones, metadata y bosques compactos); None si no hay predicciones"""
+    if not tablas:
+        print(f"[{clave}] ningún artículo con datos suficientes")
+        return None
+
+    metadata = {
+        'dataset': clave,
+        'horizonte_dias': horizonte,
+        'percentiles_arboles': list(MLPredictor.PERCENTILES_ARBOLES),
+        'modelos': modelos,
+        'modelos_compactos': compactos
+    }
+    return ForecastStore.write_run(clave, pd.concat(tablas, ignore_index=True), metadata, modelos_dir=directorio)
+
+
+def forecast_dataset(clave: str, horizonte: int = Config.FORECAST_HORIZON_DAYS) -> Optional[str]:
+    """Predice todos los artículos de un dataset y guarda la ejecución"""
+    # Los bosques se escriben en un directorio temporal que write_run publica con el run_id
+    directorio = ForecastStore.staging_models_dir(clave)
+    try:
+        if OutOfCoreTrainer.num_rows(ForecastStore.dataset_path(clave)) > Config.OOC_MAX_ROWS_IN_MEMORY:
+            return forecast_dataset_bounded(clave, horizonte, directorio)
+        return forecast_dataset_in_memory(clave, horizonte, directorio)
+    finally:
+        # Solo queda si la ejecución no llegó a publicarse
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def forecast_dataset_in_memory(clave: str, horizonte: int, directorio: str) -> Optional[str]:
+    """Versión en memoria: clasificación intermitente de todos los artículos a la vez"""
+    df = ForecastStore.load_dataset(clave)
+
+    articulos = ["Todos"]
+    if 'articulo' in df.columns:
+        articulos += sorted(df['articulo'].dropna().astype(str).unique())
+
+    # Configuraciones ganadoras de model_tuning (si existen); el resto usa la de por defecto
+    ajustes = ModelTuner.load_best(clave)
+
+    # Clasificación y predicción intermitente de todos los artículos a la vez
+    intermitentes = pd.DataFrame(columns=['modelo'])
+    if 'articulo' in df.columns:
+        intermitentes = IntermittentForecaster.forecast(df, articulos[1:])
+        intermitentes = intermitentes[intermitentes['modelo'].notna()]
+        print(f"[{clave}] {len(intermitentes)} artículos con demanda intermitente")
+
+    tablas = []
+    modelos = {}
+    compactos = {}
+    for articulo in articulos:
+        if articulo in intermitentes.index:
+            df_articulo = df[df['articulo'] == articulo]
+            resultado = IntermittentForecaster.to_result(df_articulo, articulo, intermitentes.loc[articulo], horizonte)
+            tablas.append(_forecast_table(articulo, resultado, ForecastStore.article_signature(df, articulo)))
+            modelos[articulo] = resultado['modelo_info']
+            continue
+
+        config = ajustes.get(articulo)
+        if config is not None:
+            config = {'modelo': config['modelo'], 'params': config['params']}
+        resultado = MLPredictor.predict_demand(df, articulo, horizonte, modelo_config=config, enrutar_intermitente=False)
+        if resultado is None:
+            print(f"[{clave}] {articulo}: sin predicción (datos insuficientes)")
+            continue
+
+        firma = ForecastStore.article_signature(df, articulo)
+        tablas.append(_forecast_table(articulo, resultado, firma))
+        _save_compact(directorio, articulo, resultado, firma, compactos)
+        modelos[articulo] = resultado['modelo_info']
+
+    return _write_run(clave, horizonte, tablas, modelos, compactos, directorio)
+
+
+def forecast_dataset_bounded(clave: str, horizonte: int, directorio: str) -> Optional[str]:
+    """
+    Versión con memoria acotada para datasets grandes: nunca carga el Parquet completo
+
+    Los artículos intermitentes se enrutan uno a uno (su demanda diaria + el eje de fechas).
+    """
+    path = ForecastStore.dataset_path(clave)
+    stats = OutOfCoreTrainer.dataset_stats(path)
+    ajustes = ModelTuner.load_best(clave)
+    print(f"[{clave}] modo acotado: {int(stats.loc['Todos', 'n'])} filas, {len(stats) - 1} artículos")
+
+    tablas = []
+    modelos = {}
+    compactos = {}
+    for articulo in ["Todos"] + sorted(a for a in stats.index if a != "Todos"):
+        config = ajustes.get(articulo)
+        if config is not None:
+            config = {'modelo': config['modelo'], 'params': config['params']}
+        resultado = OutOfCoreTrainer.predict_demand(path, articulo, horizonte, modelo_config=config, stats=stats)
+        if resultado is None:
+            print(f"[{clave}] {articulo}: sin predicción (datos insuficientes)")
+            continue
+
+        firma = ForecastStore.signature_from_stats(*stats.loc[articulo])
+        tablas.append(_forecast_table(articulo, resultado, firma))
+        if resultado['modelo_compacto'] is not None:
+            _save_compact(directorio, articulo, resultado, firma, compactos)
+        modelos[articulo] = resultado['modelo_info']
+
+    return _write_run(clave, horizonte, tablas, modelos, compactos, directorio)
+
+
+def run_batch(datasets: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """Ejecuta el lote sobre los datasets indicados (o todos los registrados)"""
+    ejecuciones = {}
+    for clave in datasets or ForecastStore.list_datasets():
+        inicio = time.perf_counter()
+        ejecuciones[clave] = forecast_dataset(clave)
+        print(f"[{clave}] ejecución {ejecuciones[clave]} en {time.perf_counter() - inicio:.1f}s")
+    return ejecuciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lote nocturno de predicciones de demanda")
+    parser.add_argument('--dataset', action='append', help="Clave del dataset (repetible)")
+    args = parser.parse_args()
+
+    ejecuciones = run_batch(args.dataset)
+    if not ejecuciones:
+        print(f"No hay datasets registrados en {Config.DATASETS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 import pandas as pd
 import numpy as np
 import os
+import io
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Tuple, Optional, List, Dict, Any
 import streamlit as st
+from backend.utils.config import Config
+from backend.admission import AdmissionControl
+from backend.forecast_store import ForecastStore
+from backend.out_of_core import OutOfCoreTrainer
 
 # === VERSIÓN NUEVA - DATAPROCESSOR INTEGRADO ===
 st.error("🔥 FILE_HANDLER NUEVO - DATAPROCESSOR INTEGRADO - " + pd.Timestamp.now().strftime("%H:%M:%S"))
@@ -169,19 +177,368 @@ class FileHandler:
     """FileHandler NUEVO con DataProcessor"""
     
     @staticmethod
-    def load_file(uploaded_file) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    def list_excel_sheets(uploaded_file) -> List[str]:
+        """Nombres de las hojas de un .xlsx (modo read-only, sin leer celdas)"""
+        try:
+            import openpyxl
+            wb = openpyxl.load_workbook(io.BytesIO(uploaded_file.getvalue()), read_only=True)
+            hojas = wb.sheetnames
+            wb.close()
+            return hojas
+        except Exception:
+            return []
+    
+    @staticmethod
+    def _excel_serial_to_datetime(col: pd.Series) -> pd.Series:
+        """Convierte fechas serie de Excel (días desde 1899-12-30) de forma vectorizada"""
+        seriales = pd.to_numeric(col, errors='coerce')
+        fechas = pd.to_datetime(col.where(seriales.isna()), errors='coerce')
+        # Redondeo a milisegundos (precisión de Excel) para no arrastrar el error del coma flotante
+        return fechas.fillna(pd.to_datetime(seriales, unit='D', origin='1899-12-30').dt.round('ms'))
+    
+    @staticmethod
+    def _iter_xlsx_rows(data: bytes, hoja: Optional[str] = None, indices: Optional[List[int]] = None):
+        """
+        Recorre el XML de una hoja .xlsx fila a fila sin pasar por openpyxl
+        
+        Con indices solo se convierten las celdas de esas columnas (0-based) y cada fila es una
+        tupla en ese orden; el resto de <c> se descarta por su letra de columna sin leer su valor.
+        Sin indices cada fila es un dict {columna: valor}. Las fechas llegan como número de serie.
+        """
+        import zipfile
+        import xml.etree.ElementTree as ET
+        
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            libro = ET.fromstring(z.read('xl/workbook.xml'))
+            ns = libro.tag[1:libro.tag.index('}')]
+            rel_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+            rutas = {r.get('Id'): r.get('Target') for r in ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))}
+            hojas = [(h.get('name'), rutas[h.get(rel_ns)]) for h in libro.iter(f'{{{ns}}}sheet')]
+            destino = dict(hojas)[hoja] if hoja else hojas[0][1]
+            destino = destino.lstrip('/') if destino.startswith('/') else 'xl/' + destino
+            
+            compartidas = []
+            if 'xl/sharedStrings.xml' in z.namelist():
+                with z.open('xl/sharedStrings.xml') as f:
+                    for _, si in ET.iterparse(f):
+                        if si.tag == f'{{{ns}}}si':
+                            compartidas.append(''.join(t.text or '' for t in si.iter(f'{{{ns}}}t')))
+                            si.clear()
+            
+            tag_datos, tag_fila = f'{{{ns}}}sheetData', f'{{{ns}}}row'
+            tag_v, tag_t = f'{{{ns}}}v', f'{{{ns}}}t'
+            posicion = {i: n for n, i in enumerate(indices)} if indices is not None else None
+            letras = {}
+            
+            def _columna(ref: str) -> int:
+                letra = ref.rstrip('0123456789')
+                if letra not in letras:
+                    n = 0
+                    for ch in letra:
+                        n = n * 26 + ord(ch) - 64
+                    letras[letra] = n - 1
+                return letras[letra]
+            
+            def _valor(c):
+                tipo = c.get('t')
+                if tipo == 'inlineStr':
+                    return ''.join(t.text or '' for t in c.iter(tag_t))
+                v = c.find(tag_v)
+                if v is None or v.text is None:
+                    return None
+                if tipo == 's':
+                    return compartidas[int(v.text)]
+                if tipo == 'b':
+                    return v.text == '1'
+                if tipo in ('str', 'e', 'd'):
+                    return v.text
+                try:
+                    return int(v.text)
+                except ValueError:
+                    return float(v.text)
+            
+            with z.open(destino) as f:
+                datos = None
+                for evento, elem in ET.iterparse(f, events=('start', 'end')):
+                    if evento == 'start':
+                        if elem.tag == tag_datos:
+                            datos = elem
+                        continue
+                    if elem.tag != tag_fila:
+                        continue
+                    if posicion is None:
+                        fila = {}
+                        for n, c in enumerate(elem):
+                            ref = c.get('r')
+                            fila[_columna(ref) if ref else n] = _valor(c)
+                    else:
+                        fila = [None] * len(indices)
+                        for n, c in enumerate(elem):
+                            ref = c.get('r')
+                            k = posicion.get(_columna(ref) if ref else n)
+                            if k is not None:
+                                fila[k] = _valor(c)
+                        fila = tuple(fila)
+                    # Las filas ya procesadas se sueltan para mantener la memoria acotada
+                    datos.clear()
+                    yield fila
+    
+    @staticmethod
+    def _iter_excel_chunks(data: bytes, hoja: Optional[str] = None, filas_por_bloque: Optional[int] = None):
+        """
+        Recorre una hoja .xlsx en streaming convirtiendo solo las celdas de las columnas necesarias
+        
+        Produce DataFrames de como mucho filas_por_bloque filas (todo en uno si es None).
+        Lanza ValueError si la cabecera no tiene 'fecha' y 'demanda'
+        """
+        primera = next(FileHandler._iter_xlsx_rows(data, hoja), {})
+        cabecera = [''] * (max(primera) + 1 if primera else 0)
+        for i, c in primera.items():
+            cabecera[i] = str(c).strip() if c is not None else ''
+        normalizada = [c.lower() for c in cabecera]
+        
+        faltantes = [c for c in Config.EXCEL_COLUMNS_REQUIRED if c not in normalizada]
+        if faltantes:
+            raise ValueError(f"Columnas requeridas no encontradas: {faltantes}")
+        
+        # Columnas de artículo que el detector aceptaría por nombre + opcionales presentes
+        candidatos = ForecastStore.article_candidates(cabecera)
+        if candidatos:
+            indices = [normalizada.index(c) for c in Config.EXCEL_COLUMNS_REQUIRED]
+            indices += [cabecera.index(c) for c in candidatos]
+            indices += [normalizada.index(c) for c in Config.EXCEL_COLUMNS_OPTIONAL if c in normalizada]
+        else:
+            # Sin nombre reconocible el detector recurre a columnas categóricas: no se descarta ninguna
+            indices = [i for i, c in enumerate(cabecera) if c]
+        indices = sorted(set(indices))
+        columnas = [cabecera[i] for i in indices]
+        col_fecha = cabecera[normalizada.index('fecha')]
+        
+        def _bloque(registros):
+            df = pd.DataFrame.from_records(registros, columns=columnas)
+            df = df.dropna(how='all').reset_index(drop=True)
+            if not pd.api.types.is_datetime64_any_dtype(df[col_fecha]):
+                df[col_fecha] = FileHandler._excel_serial_to_datetime(df[col_fecha])
+            return df
+        
+        filas = FileHandler._iter_xlsx_rows(data, hoja, indices)
+        next(filas, None)  # cabecera
+        registros = []
+        for fila in filas:
+            registros.append(fila)
+            if filas_por_bloque and len(registros) >= filas_por_bloque:
+                yield _bloque(registros)
+                registros = []
+        if registros or not filas_por_bloque:
+            yield _bloque(registros)
+    
+    @staticmethod
+    def _read_excel_sheet(data: bytes, hoja: Optional[str] = None) -> pd.DataFrame:
+        """Hoja completa (proyectada) en un solo DataFrame"""
+        return next(FileHandler._iter_excel_chunks(data, hoja))
+    
+    @staticmethod
+    def _read_excel_fast(data: bytes, hojas: Optional[List[str]] = None) -> pd.DataFrame:
+        """Una hoja (la primera por defecto) o varias en paralelo, concatenadas"""
+        if not hojas or len(hojas) == 1:
+            return FileHandler._read_excel_sheet(data, hojas[0] if hojas else None)
+        
+        # spawn: el servidor de Streamlit tiene hilos vivos y hacer fork desde él no es seguro
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(len(hojas), os.cpu_count() or 1), mp_context=contexto) as pool:
+            partes = list(pool.map(FileHandler._read_excel_sheet, [data] * len(hojas), hojas))
+        
+        for hoja, parte in zip(hojas, partes):
+            parte['hoja'] = hoja
+        return pd.concat(partes, ignore_index=True)
+    
+    @staticmethod
+    def _read_excel_full(data: bytes, hojas: Optional[List[str]] = None) -> pd.DataFrame:
+        """Lectura completa con pandas (sin proyección); varias hojas se concatenan igual que en la rápida"""
+        if not hojas or len(hojas) == 1:
+            return pd.read_excel(io.BytesIO(data), sheet_name=hojas[0] if hojas else 0)
+        
+        partes = pd.read_excel(io.BytesIO(data), sheet_name=hojas)
+        for hoja in hojas:
+            partes[hoja]['hoja'] = hoja
+        return pd.concat([partes[hoja] for hoja in hojas], ignore_index=True)
+    
+    @staticmethod
+    def _fingerprint(data: bytes, hojas: Optional[List[str]]) -> str:
+        huella = hashlib.sha1(data)
+        huella.update(repr(hojas).encode('utf-8'))
+        return huella.hexdigest()
+    
+    @staticmethod
+    def _cache_path(data: bytes, hojas: Optional[List[str]]) -> str:
+        return os.path.join(Config.CACHE_DIR, f"{FileHandler._fingerprint(data, hojas)}.parquet")
+    
+    @staticmethod
+    def _prune_cache() -> None:
+        """Elimina los archivos de caché menos usados hasta quedar por debajo de CACHE_MAX_MB"""
+        archivos = []
+        for nombre in os.listdir(Config.CACHE_DIR):
+            if nombre.endswith('.parquet'):
+                info = os.stat(os.path.join(Config.CACHE_DIR, nombre))
+                archivos.append((info.st_mtime, info.st_size, nombre))
+        
+        total = sum(tamaño for _, tamaño, _ in archivos)
+        for _, tamaño, nombre in sorted(archivos):
+            if total <= Config.CACHE_MAX_MB * 1024 ** 2:
+                break
+            try:
+                os.remove(os.path.join(Config.CACHE_DIR, nombre))
+            except FileNotFoundError:
+                pass
+            total -= tamaño
+    
+    @staticmethod
+    def _read_raw(uploaded_file, hojas: Optional[List[str]] = None) -> pd.DataFrame:
+        """Lee el archivo subido, usando la caché Parquet si ya se parseó antes"""
+        data = uploaded_file.getvalue()
+        cache_path = FileHandler._cache_path(data, hojas)
+        if os.path.exists(cache_path):
+            st.info("⚡ Archivo ya parseado - cargando desde caché")
+            # La fecha de modificación marca el último uso (orden LRU de _prune_cache)
+            os.utime(cache_path)
+            return pd.read_parquet(cache_path)
+        
+        if uploaded_file.name.endswith('.xlsx'):
+            try:
+                df = FileHandler._read_excel_fast(data, hojas)
+            except Exception as e:
+                # Archivo con formato inesperado: lectura completa como antes
+                st.warning(f"⚠️ Lectura rápida no disponible ({e}) - usando lectura completa")
+                df = FileHandler._read_excel_full(data, hojas)
+        elif uploaded_file.name.endswith('.xls'):
+            df = FileHandler._read_excel_full(data, hojas)
+        else:
+            df = pd.read_csv(io.BytesIO(data))
+        
+        try:
+            os.makedirs(Config.CACHE_DIR, exist_ok=True)
+            df.to_parquet(cache_path + '.tmp', index=False)
+            os.replace(cache_path + '.tmp', cache_path)
+            FileHandler._prune_cache()
+        except Exception:
+            # Tipos mezclados que Parquet no admite: simplemente no se cachea
+            if os.path.exists(cache_path + '.tmp'):
+                os.remove(cache_path + '.tmp')
+        return df
+    
+    @staticmethod
+    def spool_to_dataset(uploaded_file, hojas: Optional[List[str]] = None) -> str:
+        """
+        Vuelca el archivo por lotes a un Parquet registrado (modo acotado), sin materializarlo
+        
+        Las columnas proyectadas se normalizan a fecha/demanda/articulo/precio/promocion;
+        la de artículo se elige como en detect_unique_articles.
+        
+        Returns:
+            Ruta del Parquet en DATASETS_DIR
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        data = uploaded_file.getvalue()
+        clave = ForecastStore.dataset_key(uploaded_file.name)
+        os.makedirs(Config.DATASETS_DIR, exist_ok=True)
+        path = os.path.join(Config.DATASETS_DIR, f"{clave}.parquet")
+        
+        # Las re-ejecuciones de Streamlit no vuelven a volcar el mismo archivo. La huella va en los
+        # metadatos del propio Parquet: cualquier otra escritura (p. ej. register_dataset) la invalida
+        huella = FileHandler._fingerprint(data, hojas)
+        if os.path.exists(path):
+            try:
+                metadatos = pq.read_schema(path).metadata or {}
+            except Exception:
+                metadatos = {}
+            if metadatos.get(b'huella') == huella.encode('utf-8'):
+                return path
+        
+        canonicas = {c: c for c in Config.EXCEL_COLUMNS_REQUIRED + Config.EXCEL_COLUMNS_OPTIONAL}
+        
+        if uploaded_file.name.endswith('.csv'):
+            cabecera = list(pd.read_csv(io.BytesIO(data), nrows=0).columns)
+            candidatos = ForecastStore.article_candidates(cabecera)
+            columnas = [c for c in cabecera if str(c).strip().lower() in canonicas or c in candidatos]
+            bloques = pd.read_csv(io.BytesIO(data), chunksize=Config.OOC_BATCH_ROWS,
+                                  usecols=columnas if candidatos else None)
+        else:
+            bloques = (bloque for hoja in (hojas or [None])
+                       for bloque in FileHandler._iter_excel_chunks(data, hoja, Config.OOC_BATCH_ROWS))
+        
+        esquema = None
+        escritor = None
+        col_articulo = None
+        try:
+            for bloque in bloques:
+                if escritor is None:
+                    col_articulo = ForecastStore.article_column(bloque)
+                renombres = {c: canonicas[str(c).strip().lower()] for c in bloque.columns
+                             if str(c).strip().lower() in canonicas}
+                if col_articulo is not None:
+                    renombres[col_articulo] = 'articulo'
+                bloque = bloque[list(renombres)].rename(columns=renombres)
+                bloque = bloque.loc[:, ~bloque.columns.duplicated()]
+                bloque['fecha'] = pd.to_datetime(bloque['fecha'], errors='coerce').astype('datetime64[ns]')
+                bloque['demanda'] = pd.to_numeric(bloque['demanda'], errors='coerce').astype('float64')
+                for col in Config.EXCEL_COLUMNS_OPTIONAL:
+                    if col in bloque.columns:
+                        bloque[col] = pd.to_numeric(bloque[col], errors='coerce').astype('float64')
+                if 'articulo' in bloque.columns:
+                    bloque['articulo'] = bloque['articulo'].astype(str)
+                
+                tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+                if escritor is None:
+                    esquema = tabla.schema.with_metadata(dict(tabla.schema.metadata or {}, huella=huella))
+                    escritor = pq.ParquetWriter(path + '.tmp', esquema)
+                escritor.write_table(tabla.cast(esquema))
+        finally:
+            if escritor is not None:
+                escritor.close()
+        
+        if escritor is None:
+            raise ValueError("El archivo no contiene filas")
+        
+        # Ordenado por artículo: el entrenamiento acotado lee solo los row groups de cada artículo
+        if 'articulo' in esquema.names:
+            OutOfCoreTrainer.sort_by_article(path + '.tmp', path + '.ordenado')
+            os.remove(path + '.tmp')
+            os.replace(path + '.ordenado', path)
+        else:
+            os.replace(path + '.tmp', path)
+        return path
+    
+    @staticmethod
+    def load_file(uploaded_file, hojas: Optional[List[str]] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
         st.error("🔥 FILE_HANDLER.load_file() EJECUTADO - VERSIÓN NUEVA")
         
         try:
             st.info(f"🔍 Cargando archivo: {uploaded_file.name}")
             
-            if uploaded_file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(uploaded_file)
-            elif uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
+            if not uploaded_file.name.endswith(('.xlsx', '.xls', '.csv')):
                 return None, "Formato no soportado"
             
+            # CONTROL DE ADMISIÓN: estimar memoria antes de parsear completo
+            admision = AdmissionControl.assess(uploaded_file, hojas)
+            if admision['memoria_mb'] is not None:
+                st.info(f"🧮 Memoria estimada: {admision['memoria_mb']:.0f} MB "
+                        f"(presupuesto {Config.MEMORY_BUDGET_MB} MB) - {admision['motivo']}")
+            if admision['decision'] == 'rechazado':
+                return None, f"Archivo rechazado: {admision['motivo']}"
+            
+            dataset_en_disco = None
+            if admision['decision'] == 'acotado':
+                st.warning("⚠️ Archivo grande: se vuelca a disco por lotes y se muestra una muestra")
+                dataset_en_disco = FileHandler.spool_to_dataset(uploaded_file, hojas)
+                n_total = OutOfCoreTrainer.num_rows(dataset_en_disco)
+                df = OutOfCoreTrainer.sample(dataset_en_disco, "Todos", Config.PREVIEW_MAX_ROWS, n_total)
+                st.info(f"💾 {n_total:,} filas en disco - muestra de {len(df):,} filas en memoria")
+            else:
+                # Columna de artículo con el nombre canónico, igual que en el volcado por lotes
+                df = ForecastStore.normalize_article_column(FileHandler._read_raw(uploaded_file, hojas))
+            
             st.info(f"✅ Archivo cargado: {df.shape[0]} filas, {df.shape[1]} columnas")
             
             # LLAMAR AL DATA PROCESSOR
@@ -196,6 +553,9 @@ class FileHandler:
             else:
                 st.error("❌ NO SE CREARON NUEVAS COLUMNAS")
             
+            # En modo acotado df_processed es solo una muestra: se indica dónde está el dataset completo
+            df_processed.attrs['dataset_en_disco'] = dataset_en_disco
+            
             return df_processed, None
             
         except Exception as e:
@@ -0,0 +1,291 @@
+import pandas as pd
+import os
+import re
+import json
+import hashlib
+import shutil
+import tempfile
+from typing import Dict, Optional, Any, List, Tuple
+
+from backend.compact_forest import CompactForest
+from backend.utils.config import Config
+
+
+class ForecastStore:
+    """Almacén de predicciones materializadas en shared_data/ (Parquet versionado por ejecución)"""
+
+    # Columnas que se guardan de cada dataset registrado
+    COLUMNAS_DATASET = ['fecha', 'articulo', 'demanda', 'precio', 'promocion']
+
+    # Caché en memoria: ruta del parquet -> (mtime, DataFrame indexado por artículo)
+    _cache: Dict[str, Any] = {}
+
+    @staticmethod
+    def dataset_key(nombre: str) -> str:
+        """Nombre de archivo -> clave estable del dataset"""
+        base = os.path.splitext(os.path.basename(str(nombre)))[0]
+        clave = re.sub(r'[^0-9A-Za-z_-]+', '_', base).strip('_').lower()
+        return clave or 'dataset'
+
+    @staticmethod
+    def article_key(articulo: str) -> str:
+        """Clave de directorio sin colisiones para un artículo (nombres con '/', '.', etc.)"""
+        return hashlib.sha1(str(articulo).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def article_candidates(columnas) -> List[str]:
+        """Columnas que detect_unique_articles aceptaría por nombre: exactas primero, luego por patrón"""
+        nombres = Config.EXCEL_COLUMNS_ARTICLE
+        normalizadas = [str(c).strip().lower() for c in columnas]
+        exactas = [c for c, n in zip(columnas, normalizadas) if n in nombres]
+        patron = [c for c, n in zip(columnas, normalizadas) if n not in nombres and any(a in n for a in nombres)]
+        return exactas + patron
+
+    @staticmethod
+    def article_column(df: pd.DataFrame) -> Optional[str]:
+        """Columna de artículo de un dataset, con el mismo orden de preferencia que detect_unique_articles"""
+        if 'articulo' in df.columns:
+            return 'articulo'
+        candidatos = ForecastStore.article_candidates(df.columns)
+        if candidatos:
+            return candidatos[0]
+
+        # Sin nombre reconocible: primera columna categórica con valores repetidos
+        reservadas = Config.EXCEL_COLUMNS_REQUIRED + Config.EXCEL_COLUMNS_OPTIONAL + ['hoja']
+        for col in df.select_dtypes(include=['object']).columns:
+            if str(col).strip().lower() in reservadas:
+                continue
+            if 1 < df[col].nunique() < len(df) * 0.3:
+                return col
+        return None
+
+    @staticmethod
+    def normalize_article_column(df: pd.DataFrame) -> pd.DataFrame:
+        """Renombra la columna de artículo detectada a 'articulo' (nombre que usan el almacén y el lote)"""
+        columna = ForecastStore.article_column(df)
+        if columna is None or columna == 'articulo':
+            return df
+        return df.rename(columns={columna: 'articulo'})
+
+    @staticmethod
+    def article_signature(df: pd.DataFrame, articulo: str = "Todos") -> str:
+        """Firma barata de la historia de un artículo para detectar predicciones obsoletas"""
+        df_art = df if articulo == "Todos" or 'articulo' not in df.columns else df[df['articulo'].astype(str) == str(articulo)]
+        if df_art.empty:
+            return "0"
+        return ForecastStore.signature_from_stats(len(df_art), pd.to_datetime(df_art['fecha']).max(), df_art['demanda'].sum())
+
+    @staticmethod
+    def signature_from_stats(n: int, ultima_fecha, suma: float) -> str:
+        """Misma firma a partir de estadísticas ya agregadas (datasets leídos por lotes)"""
+        return f"{int(n)}|{pd.Timestamp(ultima_fecha):%Y-%m-%d}|{float(suma):.4f}"
+
+    @staticmethod
+    def _write_atomic_json(path: str, data: Dict[str, Any]) -> None:
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    # === REGISTRO DE DATASETS ===
+
+    @staticmethod
+    def register_dataset(df: pd.DataFrame, nombre: str) -> str:
+        """Guarda las columnas relevantes del dataset para el lote nocturno"""
+        clave = ForecastStore.dataset_key(nombre)
+        os.makedirs(Config.DATASETS_DIR, exist_ok=True)
+
+        # Misma columna de artículo que el volcado por lotes (producto, sku, ... -> articulo)
+        df = ForecastStore.normalize_article_column(df)
+        columnas = [col for col in ForecastStore.COLUMNAS_DATASET if col in df.columns]
+        df_reg = df[columnas].copy()
+        df_reg['fecha'] = pd.to_datetime(df_reg['fecha'], errors='coerce')
+        if 'articulo' in df_reg.columns:
+            # Ordenado por artículo, como los volcados por lotes (lectura por row groups)
+            df_reg['articulo'] = df_reg['articulo'].astype(str)
+            df_reg = df_reg.sort_values(['articulo', 'fecha'], kind='stable')
+
+        path = os.path.join(Config.DATASETS_DIR, f"{clave}.parquet")
+        tmp = path + '.tmp'
+        df_reg.to_parquet(tmp, index=False, row_group_size=Config.OOC_BATCH_ROWS)
+        os.replace(tmp, path)
+        return clave
+
+    @staticmethod
+    def list_datasets() -> List[str]:
+        if not os.path.isdir(Config.DATASETS_DIR):
+            return []
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(Config.DATASETS_DIR) if f.endswith('.parquet'))
+
+    @staticmethod
+    def dataset_path(clave: str) -> str:
+        return os.path.join(Config.DATASETS_DIR, f"{clave}.parquet")
+
+    @staticmethod
+    def load_dataset(clave: str) -> pd.DataFrame:
+        return pd.read_parquet(ForecastStore.dataset_path(clave))
+
+    # === EJECUCIONES VERSIONADAS ===
+
+    @staticmethod
+    def staging_models_dir(clave: str) -> str:
+        """Directorio temporal para los bosques compactos de una ejecución en curso (ver write_run)"""
+        base = os.path.join(Config.MODELS_DIR, clave)
+        os.makedirs(base, exist_ok=True)
+        return tempfile.mkdtemp(prefix='.tmp_', dir=base)
+
+    @staticmethod
+    def write_run(clave: str, predicciones: pd.DataFrame, metadata: Dict[str, Any],
+                  modelos_dir: Optional[str] = None) -> str:
+        """
+        Escribe una ejecución nueva y actualiza el puntero 'latest.json'
+
+        Args:
+            clave: Clave del dataset
+            predicciones: Tabla larga (articulo, fecha, paso, prediccion, arboles_p10, arboles_p50, arboles_p90, ...)
+            metadata: Información del lote (modelo, horizonte, etc.)
+            modelos_dir: Directorio de staging_models_dir con los bosques de la ejecución; se
+                publica como MODELS_DIR/<clave>/<run_id> antes de actualizar el puntero
+
+        Returns:
+            Identificador de la ejecución
+        """
+        directorio = os.path.join(Config.FORECASTS_DIR, clave)
+        os.makedirs(directorio, exist_ok=True)
+
+        generado_en = pd.Timestamp.now()
+        run_id = generado_en.strftime('%Y%m%dT%H%M%S')
+
+        # Ordenado por artículo para que los row groups permitan filtrar por artículo
+        tabla = predicciones.sort_values(['articulo', 'fecha']).reset_index(drop=True)
+        tabla['run_ts'] = generado_en
+        path = os.path.join(directorio, f"{run_id}.parquet")
+        tabla.to_parquet(path + '.tmp', index=False, row_group_size=max(Config.FORECAST_HORIZON_DAYS, 1) * 64)
+        os.replace(path + '.tmp', path)
+
+        manifest = dict(metadata)
+        manifest.update({
+            'run_id': run_id,
+            'generado_en': generado_en.isoformat(),
+            'archivo': os.path.basename(path),
+            'articulos': int(tabla['articulo'].nunique())
+        })
+        # Los modelos de cada ejecución viven en su propio directorio: nunca se sobrescriben
+        # archivos que la app pueda tener memory-mapped
+        if modelos_dir is not None:
+            os.replace(modelos_dir, os.path.join(Config.MODELS_DIR, clave, run_id))
+        ForecastStore._write_atomic_json(os.path.join(directorio, 'latest.json'), manifest)
+
+        # Conservar solo las últimas ejecuciones (tablas y modelos)
+        ejecuciones = sorted(f for f in os.listdir(directorio) if f.endswith('.parquet'))
+        for antigua in ejecuciones[:-Config.FORECAST_KEEP_RUNS]:
+            os.remove(os.path.join(directorio, antigua))
+        conservadas = {os.path.splitext(f)[0] for f in ejecuciones[-Config.FORECAST_KEEP_RUNS:]}
+        directorio_modelos = os.path.join(Config.MODELS_DIR, clave)
+        if os.path.isdir(directorio_modelos):
+            for nombre in os.listdir(directorio_modelos):
+                if not nombre.startswith('.') and nombre not in conservadas:
+                    shutil.rmtree(os.path.join(directorio_modelos, nombre), ignore_errors=True)
+
+        return run_id
+
+    @staticmethod
+    def latest_run(clave: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(Config.FORECASTS_DIR, clave, 'latest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _load_table(path: str) -> pd.DataFrame:
+        """Carga (una vez por versión) la tabla de una ejecución indexada por artículo"""
+        mtime = os.path.getmtime(path)
+        cached = ForecastStore._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        tabla = pd.read_parquet(path).set_index('articulo').sort_index()
+        ForecastStore._cache[path] = (mtime, tabla)
+        return tabla
+
+    @staticmethod
+    def load_compact_model(clave: str, articulo: str, firma: str) -> Optional[Tuple[CompactForest, str]]:
+        """
+        Bosque compacto guardado por el último lote (memory-mapped), si se entrenó con
+        los mismos datos del artículo
+
+        Permite predecir sin reentrenar cuando la tabla materializada ya es antigua o
+        el horizonte pedido es mayor que el guardado.
+
+        Returns:
+            (modelo, modelo_info) o None
+        """
+        manifest = ForecastStore.latest_run(clave)
+        if manifest is None:
+            return None
+        registro = manifest.get('modelos_compactos', {}).get(str(articulo))
+        if registro is None or registro['firma'] != firma:
+            return None
+
+        path = os.path.join(Config.MODELS_DIR, clave, manifest['run_id'], registro['clave'])
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        return CompactForest.load(path), manifest['modelos'][str(articulo)]
+
+    @staticmethod
+    def load_forecast(clave: str, df: pd.DataFrame, articulo: str = "Todos", dias_futuro: int = 30,
+                      firma: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la predicción materializada si está vigente para el artículo
+
+        Args:
+            clave: Clave del dataset
+            df: Datos históricos actuales (para comprobar que no cambiaron)
+            articulo: Artículo específico o "Todos"
+            dias_futuro: Número de días a devolver
+            firma: Firma del artículo ya calculada (cuando df es solo una muestra del dataset)
+
+        Returns:
+            Dict con el mismo formato que MLPredictor.predict_demand, o None si falta u
+            está obsoleta (en cuyo caso hay que calcularla en vivo)
+        """
+        manifest = ForecastStore.latest_run(clave)
+        if manifest is None or dias_futuro > manifest.get('horizonte_dias', 0):
+            return None
+
+        generado_en = pd.Timestamp(manifest['generado_en'])
+        if pd.Timestamp.now() - generado_en > pd.Timedelta(hours=Config.FORECAST_MAX_AGE_HOURS):
+            return None
+
+        path = os.path.join(Config.FORECASTS_DIR, clave, manifest['archivo'])
+        if not os.path.exists(path):
+            return None
+
+        tabla = ForecastStore._load_table(path)
+        if str(articulo) not in tabla.index:
+            return None
+
+        filas = tabla.loc[[str(articulo)]]
+        if filas['firma'].iloc[0] != (firma or ForecastStore.article_signature(df, articulo)):
+            return None
+
+        filas = filas.iloc[:dias_futuro]
+        df_hist = df if articulo == "Todos" or 'articulo' not in df.columns else df[df['articulo'].astype(str) == str(articulo)]
+        df_hist = df_hist.sort_values('fecha')
+
+        return {
+            'fechas_historicas': pd.to_datetime(df_hist['fecha']).values,
+            'demanda_historica': df_hist['demanda'].values,
+            'fechas_futuras': pd.DatetimeIndex(filas['fecha']),
+            'predicciones': filas['prediccion'].values,
+            'articulo': articulo,
+            'dias_prediccion': dias_futuro,
+            'modelo_info': filas['modelo_info'].iloc[0],
+            'dispersion_arboles': {q: filas[f"arboles_p{round(q * 100)}"].values
+                                   for q in manifest.get('percentiles_arboles', [])
+                                   if filas[f"arboles_p{round(q * 100)}"].notna().any()},
+            'generado_en': generado_en,
+            'origen': 'almacen',
+            'run_id': manifest['run_id']
+        }
@@ -0,0 +1,191 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Optional, Any, List, Tuple
+
+
+class IntermittentForecaster:
+    """
+    Modelos de demanda intermitente (Croston, SBA, TSB) vectorizados sobre todas las series
+
+    El eje temporal son las fechas con registros del dataset completo: un artículo
+    sin registro (o con demanda 0) en una de esas fechas cuenta como periodo sin venta.
+    Cada serie empieza en su primera venta: los periodos anteriores (artículo aún no
+    lanzado) no cuentan para ADI ni para las recursiones.
+    """
+
+    # Clasificación Syntetos-Boylan: intervalo medio entre demandas (ADI) y CV² de los tamaños
+    ADI_CORTE = 1.32
+    CV2_CORTE = 0.49
+
+    # Modelo por clase; las series 'regular' y 'erratica' siguen con el bosque
+    MODELO_POR_CLASE = {'intermitente': 'SBA', 'irregular': 'TSB'}
+
+    ALPHA = 0.1  # suavizado del tamaño y del intervalo
+    BETA = 0.1   # suavizado de la probabilidad de demanda (TSB)
+
+    # Sin ventas durante más de este múltiplo de su ADI: posible descatalogado, se usa TSB
+    # (su probabilidad decae con cada periodo sin venta; Croston/SBA mantendrían el nivel antiguo)
+    FACTOR_SIN_VENTA = 2
+
+    @staticmethod
+    def dataset_dates(df: pd.DataFrame) -> np.ndarray:
+        """Eje temporal común: fechas (normalizadas) con registros en el dataset"""
+        return np.sort(pd.to_datetime(df['fecha']).dt.normalize().dropna().unique())
+
+    @staticmethod
+    def demand_matrix(df: pd.DataFrame, articulos: List[str], fechas_eje: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Matriz (n_articulos, n_periodos) de demanda sobre las fechas del dataset
+
+        fechas_eje permite pasar solo las filas de algunos artículos conservando el eje
+        temporal del dataset completo (ver dataset_dates)
+        """
+        fechas = pd.to_datetime(df['fecha']).dt.normalize()
+        if fechas_eje is None:
+            fechas_eje = np.sort(fechas.dropna().unique())
+        matriz = (df.assign(fecha=fechas, articulo=df['articulo'].astype(str))
+                  .pivot_table(index='articulo', columns='fecha', values='demanda', aggfunc='sum', fill_value=0)
+                  .reindex(index=[str(a) for a in articulos], columns=fechas_eje, fill_value=0))
+        return np.clip(matriz.to_numpy(dtype=np.float64), 0, None)
+
+    @staticmethod
+    def active_periods(Y: np.ndarray) -> np.ndarray:
+        """Máscara de los periodos de cada serie desde su primera demanda"""
+        return np.cumsum(Y > 0, axis=1) > 0
+
+    @staticmethod
+    def classify(Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Clase, ADI y CV² de cada serie (fila de Y)"""
+        hay_demanda = Y > 0
+        n_demandas = hay_demanda.sum(axis=1)
+        n_periodos = IntermittentForecaster.active_periods(Y).sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            adi = np.where(n_demandas > 0, n_periodos / n_demandas, np.inf)
+            media = Y.sum(axis=1) / n_demandas
+            varianza = (Y ** 2).sum(axis=1) / n_demandas - media ** 2
+            cv2 = np.nan_to_num(np.clip(varianza, 0, None) / media ** 2)
+
+        intermitente = adi >= IntermittentForecaster.ADI_CORTE
+        variable = cv2 >= IntermittentForecaster.CV2_CORTE
+        clases = np.select(
+            [intermitente & variable, intermitente, variable],
+            ['irregular', 'intermitente', 'erratica'],
+            default='regular'
+        )
+        return clases, adi, cv2
+
+    @staticmethod
+    def _initial_state(Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Tamaño medio e intervalo medio como estado inicial"""
+        n_demandas = (Y > 0).sum(axis=1)
+        n_periodos = IntermittentForecaster.active_periods(Y).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tamaño = np.nan_to_num(Y.sum(axis=1) / n_demandas)
+            intervalo = np.where(n_demandas > 0, n_periodos / n_demandas, np.inf)
+        return tamaño, intervalo
+
+    @staticmethod
+    def croston(Y: np.ndarray, alpha: float = ALPHA, sba: bool = False) -> np.ndarray:
+        """Nivel por periodo de Croston (o SBA si sba=True) para cada serie"""
+        tamaño, intervalo = IntermittentForecaster._initial_state(Y)
+        desde_ultima = np.ones(Y.shape[0])
+        iniciada = np.zeros(Y.shape[0], dtype=bool)
+
+        for t in range(Y.shape[1]):
+            d = Y[:, t]
+            hay = d > 0
+            tamaño = np.where(hay, tamaño + alpha * (d - tamaño), tamaño)
+            # La primera venta no tiene intervalo previo (los periodos antes del lanzamiento no cuentan)
+            intervalo = np.where(hay & iniciada, intervalo + alpha * (desde_ultima - intervalo), intervalo)
+            desde_ultima = np.where(hay, 1, desde_ultima + 1)
+            iniciada |= hay
+
+        nivel = tamaño / intervalo
+        return nivel * (1 - alpha / 2) if sba else nivel
+
+    @staticmethod
+    def tsb(Y: np.ndarray, alpha: float = ALPHA, beta: float = BETA) -> np.ndarray:
+        """Nivel por periodo de TSB: la probabilidad se actualiza en todos los periodos"""
+        tamaño, intervalo = IntermittentForecaster._initial_state(Y)
+        probabilidad = 1 / intervalo
+        activo = IntermittentForecaster.active_periods(Y)
+
+        for t in range(Y.shape[1]):
+            d = Y[:, t]
+            hay = d > 0
+            probabilidad = np.where(activo[:, t], probabilidad + beta * (hay - probabilidad), probabilidad)
+            tamaño = np.where(hay, tamaño + alpha * (d - tamaño), tamaño)
+
+        return probabilidad * tamaño
+
+    @staticmethod
+    def forecast(df: pd.DataFrame, articulos: List[str], fechas_eje: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Clasifica todas las series y predice las intermitentes de una sola vez
+
+        Args:
+            df: Registros (del dataset completo o solo de los artículos pedidos)
+            articulos: Artículos a clasificar
+            fechas_eje: Eje temporal del dataset completo si df es un subconjunto
+
+        Returns:
+            DataFrame indexado por artículo con clase, adi, cv2, modelo (None = bosque) y nivel
+        """
+        articulos = [str(a) for a in articulos]
+        Y = IntermittentForecaster.demand_matrix(df, articulos, fechas_eje)
+        clases, adi, cv2 = IntermittentForecaster.classify(Y)
+
+        resultado = pd.DataFrame({'clase': clases, 'adi': adi, 'cv2': cv2}, index=articulos)
+        resultado['modelo'] = resultado['clase'].map(IntermittentForecaster.MODELO_POR_CLASE)
+
+        # Periodos desde la última venta: las series intermitentes paradas pasan a TSB
+        hay = Y > 0
+        sin_venta = np.where(hay.any(axis=1), np.argmax(hay[:, ::-1], axis=1), Y.shape[1])
+        parada = (sin_venta > IntermittentForecaster.FACTOR_SIN_VENTA * adi) & resultado['modelo'].notna().to_numpy()
+        resultado.loc[parada, 'modelo'] = 'TSB'
+        resultado['nivel'] = np.nan
+
+        for modelo, funcion in (('SBA', lambda m: IntermittentForecaster.croston(m, sba=True)),
+                                ('TSB', IntermittentForecaster.tsb)):
+            filas = (resultado['modelo'] == modelo).to_numpy()
+            if filas.any():
+                resultado.loc[filas, 'nivel'] = funcion(Y[filas])
+
+        return resultado
+
+    @staticmethod
+    def to_result(df_articulo: pd.DataFrame, articulo: str, fila: pd.Series, dias_futuro: int) -> Dict[str, Any]:
+        """Resultado con el mismo formato que MLPredictor.predict_demand"""
+        df_articulo = df_articulo.sort_values('fecha')
+        fechas_historicas = pd.to_datetime(df_articulo['fecha'])
+        fechas_futuras = pd.date_range(start=fechas_historicas.max() + pd.Timedelta(days=1), periods=dias_futuro, freq='D')
+
+        return {
+            'fechas_historicas': fechas_historicas.values,
+            'demanda_historica': df_articulo['demanda'].values,
+            'fechas_futuras': fechas_futuras,
+            'predicciones': np.full(dias_futuro, fila['nivel']),
+            'articulo': articulo,
+            'dias_prediccion': dias_futuro,
+            'modelo_info': f"{fila['modelo']} (alpha={IntermittentForecaster.ALPHA}) - demanda {fila['clase']}, ADI={fila['adi']:.1f}, CV²={fila['cv2']:.2f}",
+            'modelo_params': {'modelo': fila['modelo'], 'alpha': IntermittentForecaster.ALPHA, 'beta': IntermittentForecaster.BETA},
+            'dispersion_arboles': {},
+            'modelo_compacto': None
+        }
+
+    @staticmethod
+    def route(df: pd.DataFrame, articulo: str, fechas_eje: Optional[np.ndarray] = None) -> Optional[pd.Series]:
+        """
+        Clasificación de un artículo si debe ir a un modelo intermitente, si no None
+
+        fechas_eje: eje temporal del dataset si df no es el dataset completo (p. ej. solo el artículo)
+        """
+        if articulo == "Todos" or 'articulo' not in df.columns:
+            return None
+        # Solo se pivotan las filas del artículo, sobre el eje de fechas del dataset completo
+        if fechas_eje is None:
+            fechas_eje = IntermittentForecaster.dataset_dates(df)
+        df_articulo = df[df['articulo'].astype(str) == str(articulo)]
+        fila = IntermittentForecaster.forecast(df_articulo, [articulo], fechas_eje).iloc[0]
+        return fila if isinstance(fila['modelo'], str) else None
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
 from sklearn.model_selection import train_test_split
 import streamlit as st
+from backend.compact_forest import CompactForest
+from backend.intermittent import IntermittentForecaster
 from typing import Dict, Optional, Any
 
 # === DEBUG: VERIFICAR QUE EL ARCHIVO SE CARGA ===
@@ -11,8 +13,37 @@ st.success("🔥 ml_predictor.py CARGADO - " + pd.Timestamp.now().strftime("%H:%
 class MLPredictor:
     """Predictor de Machine Learning para demostración en conferencia"""
     
+    # Percentiles de las predicciones de los árboles individuales: miden el desacuerdo entre
+    # árboles (incertidumbre del modelo), no la variabilidad de la demanda; no son un intervalo de predicción
+    PERCENTILES_ARBOLES = (0.1, 0.5, 0.9)
+    
+    # Modelos soportados (todos exportables a CompactForest) y configuración por defecto
+    MODELOS = {'RandomForest': RandomForestRegressor, 'ExtraTrees': ExtraTreesRegressor}
+    CONFIG_DEFECTO = {'modelo': 'RandomForest', 'params': {'n_estimators': 100, 'max_depth': 10}}
+    
     @staticmethod
-    def predict_demand(df: pd.DataFrame, articulo: str = "Todos", dias_futuro: int = 30) -> Optional[Dict[str, Any]]:
+    def build_model(modelo_config: Optional[Dict[str, Any]] = None):
+        """Instancia el estimador descrito por {'modelo': ..., 'params': {...}}"""
+        config = modelo_config or MLPredictor.CONFIG_DEFECTO
+        params = dict(config['params'])
+        params.setdefault('random_state', 42)
+        return MLPredictor.MODELOS[config['modelo']](**params)
+    
+    @staticmethod
+    def temporal_features(fechas) -> pd.DataFrame:
+        """Features temporales usadas por el modelo (mismo orden en entrenamiento y predicción)"""
+        fechas = pd.DatetimeIndex(fechas)
+        return pd.DataFrame({
+            'año': fechas.year,
+            'mes': fechas.month,
+            'dia': fechas.day,
+            'dia_semana': fechas.dayofweek
+        })
+    
+    @staticmethod
+    def predict_demand(df: pd.DataFrame, articulo: str = "Todos", dias_futuro: int = 30,
+                       modelo_config: Optional[Dict[str, Any]] = None,
+                       enrutar_intermitente: bool = True) -> Optional[Dict[str, Any]]:
         """
         Predice demanda futura usando Random Forest
         
@@ -20,6 +51,8 @@ class MLPredictor:
             df: DataFrame con datos históricos
             articulo: Artículo específico o "Todos"
             dias_futuro: Número de días a predecir (7-365)
+            modelo_config: Configuración ajustada (ver ModelTuner); por defecto CONFIG_DEFECTO
+            enrutar_intermitente: Si True, los artículos intermitentes usan Croston/SBA/TSB
             
         Returns:
             Dict con datos históricos y predicciones
@@ -51,6 +84,13 @@ class MLPredictor:
                     
                 df_ml = df_ml[df_ml['articulo'] == articulo]
                 st.info(f"✅ Filtrando por artículo: {articulo} - {len(df_ml)} registros")
+                
+                # Artículos de demanda intermitente: Croston/SBA/TSB en lugar del bosque
+                if enrutar_intermitente and len(df_ml) > 0:
+                    clasificacion = IntermittentForecaster.route(df, articulo)
+                    if clasificacion is not None:
+                        st.info(f"📉 Demanda {clasificacion['clase']} - usando modelo {clasificacion['modelo']}")
+                        return IntermittentForecaster.to_result(df_ml, articulo, clasificacion, dias_futuro)
             
             # VERIFICAR QUE HAY SUFICIENTES DATOS
             if len(df_ml) < 10:
@@ -88,61 +128,94 @@ class MLPredictor:
             st.info(f"📊 Datos para entrenamiento: {X.shape[0]} muestras, {X.shape[1]} features")
             
             # ENTRENAR MODELO
-            st.info("🏋️ Entrenando modelo Random Forest...")
-            model = RandomForestRegressor(
-                n_estimators=100,
-                random_state=42,
-                max_depth=10
-            )
+            config = modelo_config or MLPredictor.CONFIG_DEFECTO
+            st.info(f"🏋️ Entrenando modelo {config['modelo']}...")
+            model = MLPredictor.build_model(config)
             
             model.fit(X, y)
             st.success("✅ Modelo entrenado exitosamente")
             
-            # GENERAR PREDICCIONES FUTURAS
-            st.info("🔮 Generando predicciones futuras...")
-            
-            ultima_fecha = df_ml['fecha'].max()
-            st.info(f"📅 Última fecha histórica: {ultima_fecha.strftime('%Y-%m-%d')}")
-            
-            # Crear fechas futuras
-            fechas_futuras = pd.date_range(
-                start=ultima_fecha + pd.Timedelta(days=1),
-                periods=dias_futuro,
-                freq='D'
+            return MLPredictor.forecast_from_model(
+                model, config, df_ml['fecha'].values, df_ml['demanda'].values, articulo, dias_futuro
             )
             
-            # Preparar features para fechas futuras
-            X_future = pd.DataFrame({
-                'año': fechas_futuras.year,
-                'mes': fechas_futuras.month,
-                'dia': fechas_futuras.day,
-                'dia_semana': fechas_futuras.dayofweek
-            })
-            
-            # Hacer predicciones
-            predicciones = model.predict(X_future)
-            
-            st.success(f"🎯 Predicción completada - {len(predicciones)} días futuros")
-            
-            # PREPARAR RESULTADOS
-            resultado = {
-                'fechas_historicas': df_ml['fecha'].values,
-                'demanda_historica': df_ml['demanda'].values,
-                'fechas_futuras': fechas_futuras,
-                'predicciones': predicciones,
-                'articulo': articulo,
-                'dias_prediccion': dias_futuro,
-                'modelo_info': f"RandomForest (n_estimators=100)"
-            }
-            
-            return resultado
-            
         except Exception as e:
             st.error(f"❌ ERROR en predict_demand: {str(e)}")
             import traceback
             st.error(f"📋 Traceback: {traceback.format_exc()}")
             return None
     
+    @staticmethod
+    def forecast_from_model(model, config: Dict[str, Any], fechas_historicas, demanda_historica,
+                            articulo: str, dias_futuro: int, ultima_fecha=None) -> Dict[str, Any]:
+        """
+        Genera las predicciones futuras de un modelo entrenado y arma el resultado
+        
+        ultima_fecha se indica cuando el histórico es solo una muestra (entrenamiento acotado)
+        """
+        modelo_info = f"{config['modelo']} (" + ", ".join(f"{k}={v}" for k, v in config['params'].items()) + ")"
+        resultado = MLPredictor.forecast_from_compact(
+            CompactForest.from_sklearn(model), modelo_info, fechas_historicas, demanda_historica,
+            articulo, dias_futuro, ultima_fecha=ultima_fecha, model=model
+        )
+        resultado['modelo_params'] = model.get_params()
+        return resultado
+    
+    @staticmethod
+    def forecast_from_compact(modelo_compacto: CompactForest, modelo_info: str, fechas_historicas, demanda_historica,
+                              articulo: str, dias_futuro: int, ultima_fecha=None, model=None) -> Dict[str, Any]:
+        """
+        Predicciones futuras a partir de un bosque compacto (recién exportado o cargado de disco)
+        
+        Si se pasa el modelo sklearn y el horizonte supera CompactForest.MAX_FILAS_RAPIDO,
+        se usa la predicción por árbol de sklearn, más rápida en lotes grandes.
+        """
+        
+        # GENERAR PREDICCIONES FUTURAS
+        st.info("🔮 Generando predicciones futuras...")
+        
+        if ultima_fecha is None:
+            ultima_fecha = pd.to_datetime(fechas_historicas).max()
+        ultima_fecha = pd.Timestamp(ultima_fecha)
+        st.info(f"📅 Última fecha histórica: {ultima_fecha.strftime('%Y-%m-%d')}")
+        
+        # Crear fechas futuras
+        fechas_futuras = pd.date_range(
+            start=ultima_fecha + pd.Timedelta(days=1),
+            periods=dias_futuro,
+            freq='D'
+        )
+        
+        # Preparar features para fechas futuras
+        X_future = MLPredictor.temporal_features(fechas_futuras).values
+        
+        # Hacer predicciones
+        # Bosque compacto (arrays planos, todos los árboles a la vez) en horizontes cortos
+        if model is None or len(X_future) <= CompactForest.MAX_FILAS_RAPIDO:
+            predicciones_arboles = modelo_compacto.predict_trees(X_future)
+        else:
+            predicciones_arboles = np.stack([arbol.predict(X_future) for arbol in model.estimators_])
+        predicciones = predicciones_arboles.mean(axis=0)
+        
+        # Dispersión entre las predicciones individuales de cada árbol
+        dispersion_arboles = {q: np.quantile(predicciones_arboles, q, axis=0) for q in MLPredictor.PERCENTILES_ARBOLES}
+        
+        st.success(f"🎯 Predicción completada - {len(predicciones)} días futuros")
+        
+        # PREPARAR RESULTADOS
+        return {
+            'fechas_historicas': fechas_historicas,
+            'demanda_historica': demanda_historica,
+            'fechas_futuras': fechas_futuras,
+            'predicciones': predicciones,
+            'articulo': articulo,
+            'dias_prediccion': dias_futuro,
+            'modelo_info': modelo_info,
+            'modelo_params': {},
+            'dispersion_arboles': dispersion_arboles,
+            'modelo_compacto': modelo_compacto
+        }
+    
     @staticmethod
     def export_to_excel(prediction_data: Dict[str, Any]) -> bytes:
         """Exporta datos históricos y predicciones a Excel"""
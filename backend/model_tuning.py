@@ -0,0 +1,302 @@
+"""
+Búsqueda de hiperparámetros con successive halving
+
+Cada candidato (modelo + parámetros) se evalúa primero con pocos árboles; solo
+los mejores de cada ronda pasan a la siguiente con más árboles, y la última ronda
+usa el número de árboles con el que se guarda la configuración. La evaluación
+usa ventanas de validación ordenadas en el tiempo, las features se calculan una
+vez por grupo y los trials se reparten en un único pool de procesos por dataset.
+
+Uso:
+    python -m backend.model_tuning --dataset ventas --presupuesto 300
+    python -m backend.model_tuning --dataset ventas --grupos grupos.json   # {"bebidas": ["A", "B"], ...}
+"""
+import argparse
+
+import backend.utils.headless  # antes que los módulos del backend
+
+import itertools
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.metrics import mean_absolute_error
+from typing import Dict, Optional, Any, List, Tuple
+
+from backend.ml_predictor import MLPredictor
+from backend.forecast_store import ForecastStore
+from backend.out_of_core import OutOfCoreTrainer
+from backend.utils.config import Config
+
+
+# Datos del grupo en curso en cada proceso del pool: se guardan una vez en disco por grupo y cada
+# worker los abre memory-mapped la primera vez que evalúa un trial de ese grupo
+_datos: Dict[str, Tuple[np.ndarray, np.ndarray, List[Tuple[np.ndarray, np.ndarray]]]] = {}
+
+
+def _load_group(ruta: str) -> Tuple[np.ndarray, np.ndarray, List[Tuple[np.ndarray, np.ndarray]]]:
+    if ruta not in _datos:
+        _datos.clear()
+        X = np.load(os.path.join(ruta, 'X.npy'), mmap_mode='r')
+        y = np.load(os.path.join(ruta, 'y.npy'), mmap_mode='r')
+        _datos[ruta] = (X, y, ModelTuner.time_windows(len(y)))
+    return _datos[ruta]
+
+
+def _evaluate(ruta: str, indice: int, config: Dict[str, Any], n_arboles: int) -> Tuple[int, float]:
+    """MAE medio de un candidato sobre las ventanas temporales, con n_arboles árboles"""
+    X, y, ventanas = _load_group(ruta)
+    params = dict(config['params'], n_estimators=n_arboles)
+    errores = []
+    for entrenamiento, validacion in ventanas:
+        modelo = MLPredictor.build_model({'modelo': config['modelo'], 'params': params})
+        modelo.fit(X[entrenamiento], y[entrenamiento])
+        errores.append(mean_absolute_error(y[validacion], modelo.predict(X[validacion])))
+    return indice, float(np.mean(errores))
+
+
+class ModelTuner:
+    """Ajuste de hiperparámetros por artículo (o grupo de artículos)"""
+
+    # Espacio de búsqueda: todas las combinaciones por tipo de modelo
+    # (el número de árboles no se busca: es el recurso que reparte successive halving)
+    ESPACIO = {
+        'RandomForest': {
+            'max_depth': [5, 10, None],
+            'min_samples_leaf': [1, 5],
+            'max_features': [1.0, 0.5]
+        },
+        'ExtraTrees': {
+            'max_depth': [5, 10, None],
+            'min_samples_leaf': [1, 5],
+            'max_features': [1.0, 0.5]
+        }
+    }
+
+    @staticmethod
+    def candidates() -> List[Dict[str, Any]]:
+        candidatos = []
+        for modelo, espacio in ModelTuner.ESPACIO.items():
+            nombres = list(espacio)
+            for valores in itertools.product(*(espacio[n] for n in nombres)):
+                candidatos.append({'modelo': modelo, 'params': dict(zip(nombres, valores))})
+        return candidatos
+
+    @staticmethod
+    def build_features(df: pd.DataFrame, articulos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Features y objetivo ordenados por fecha (calculados una sola vez)"""
+        df_ml = df
+        if articulos != ["Todos"] and 'articulo' in df.columns:
+            df_ml = df[df['articulo'].astype(str).isin([str(a) for a in articulos])]
+        df_ml = df_ml.sort_values('fecha')
+        X = MLPredictor.temporal_features(pd.to_datetime(df_ml['fecha'])).to_numpy(dtype=np.float64)
+        return X, df_ml['demanda'].to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def time_windows(n: int, n_ventanas: int = Config.TUNING_WINDOWS) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Ventanas expansivas: se entrena con el pasado y se valida con el bloque siguiente"""
+        tamaño = n // (n_ventanas + 1)
+        ventanas = []
+        for i in range(n_ventanas):
+            fin_validacion = n if i == n_ventanas - 1 else tamaño * (i + 2)
+            ventanas.append((np.arange(0, tamaño * (i + 1)), np.arange(tamaño * (i + 1), fin_validacion)))
+        return ventanas
+
+    @staticmethod
+    def successive_halving(X: np.ndarray, y: np.ndarray, presupuesto_s: float = Config.TUNING_BUDGET_SECONDS,
+                           eta: int = 3, min_arboles: int = 10,
+                           max_arboles: int = MLPredictor.CONFIG_DEFECTO['params']['n_estimators'],
+                           n_procesos: Optional[int] = None,
+                           pool: Optional[ProcessPoolExecutor] = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la mejor configuración encontrada dentro del presupuesto de tiempo
+
+        Args:
+            X, y: Features y objetivo ordenados en el tiempo
+            presupuesto_s: Presupuesto de reloj en segundos
+            eta: Factor de reducción por ronda (se conserva 1/eta de los candidatos)
+            min_arboles: Mínimo de árboles por trial (primeras rondas)
+            max_arboles: Árboles de la última ronda (los de la configuración guardada)
+            n_procesos: Procesos del pool (None = núcleos disponibles)
+            pool: Pool reutilizable entre grupos; si es None se crea uno para esta búsqueda
+
+        Returns:
+            {'modelo', 'params', 'mae', 'rondas', 'arboles_evaluados', 'completo'} o None si no se
+            completó ningún trial. params['n_estimators'] es siempre max_arboles; si el presupuesto
+            se agotó antes de la última ronda, el ganador se eligió con arboles_evaluados árboles
+            (completo=False)
+        """
+        if len(y) < 4 * (Config.TUNING_WINDOWS + 1):
+            return None
+
+        limite = time.monotonic() + presupuesto_s
+        n_procesos = n_procesos or os.cpu_count() or 1
+        candidatos = ModelTuner.candidates()
+        vivos = list(range(len(candidatos)))
+        # Rondas hasta quedar un superviviente; los árboles crecen x eta hasta max_arboles en la última
+        rondas = max(1, math.ceil(math.log(len(candidatos), eta)))
+        mejor = None
+
+        ruta = tempfile.mkdtemp(prefix='tuning_')
+        np.save(os.path.join(ruta, 'X.npy'), np.ascontiguousarray(X))
+        np.save(os.path.join(ruta, 'y.npy'), np.ascontiguousarray(y))
+        propio = pool is None
+        if propio:
+            pool = ProcessPoolExecutor(max_workers=n_procesos)
+        try:
+            for ronda in range(rondas):
+                n_arboles = max(min_arboles, round(max_arboles / eta ** (rondas - 1 - ronda)))
+                resultados = {}
+                pendientes = set()
+                cola = list(vivos)
+
+                # Se lanzan trials mientras quede tiempo; al agotarse se cancela el resto
+                while cola or pendientes:
+                    while cola and len(pendientes) < n_procesos * 2 and time.monotonic() < limite:
+                        i = cola.pop(0)
+                        pendientes.add(pool.submit(_evaluate, ruta, i, candidatos[i], n_arboles))
+                    if not pendientes:
+                        break
+                    hechos, pendientes = wait(pendientes, timeout=max(limite - time.monotonic(), 0),
+                                              return_when=FIRST_COMPLETED)
+                    for futuro in hechos:
+                        i, mae = futuro.result()
+                        resultados[i] = mae
+                    if time.monotonic() >= limite:
+                        for futuro in pendientes:
+                            futuro.cancel()
+                        break
+
+                if not resultados:
+                    break
+
+                ordenados = sorted(resultados, key=resultados.get)
+                ganador = candidatos[ordenados[0]]
+                mejor = {'modelo': ganador['modelo'], 'params': dict(ganador['params'], n_estimators=max_arboles),
+                         'mae': resultados[ordenados[0]], 'rondas': ronda + 1,
+                         'arboles_evaluados': n_arboles, 'completo': n_arboles == max_arboles}
+                vivos = ordenados[:math.ceil(len(ordenados) / eta)]
+                if len(vivos) == 1 or time.monotonic() >= limite:
+                    break
+        finally:
+            if propio:
+                pool.shutdown(cancel_futures=True)
+            shutil.rmtree(ruta, ignore_errors=True)
+
+        return mejor
+
+    # === PERSISTENCIA DE CONFIGURACIONES GANADORAS ===
+
+    @staticmethod
+    def _best_path(clave: str) -> str:
+        return os.path.join(Config.TUNING_DIR, f"{clave}.json")
+
+    @staticmethod
+    def load_best(clave: str) -> Dict[str, Dict[str, Any]]:
+        path = ModelTuner._best_path(clave)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_best(clave: str, mejores: Dict[str, Dict[str, Any]]) -> None:
+        os.makedirs(Config.TUNING_DIR, exist_ok=True)
+        path = ModelTuner._best_path(clave)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(mejores, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def tune_dataset(clave: str, grupos: Optional[Dict[str, List[str]]] = None,
+                     presupuesto_s: float = Config.TUNING_BUDGET_SECONDS,
+                     n_procesos: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Ajusta cada artículo (o grupo) de un dataset registrado y guarda los ganadores
+
+        Args:
+            clave: Clave del dataset registrado
+            grupos: {nombre_grupo: [articulos]}; por defecto un grupo por artículo
+            presupuesto_s: Presupuesto total de reloj, repartido entre los grupos
+            n_procesos: Procesos del pool, compartido por todos los grupos (None = núcleos disponibles)
+
+        Returns:
+            Configuración ganadora por artículo
+        """
+        # Datasets grandes: cada grupo se ajusta sobre una muestra leída por lotes del disco
+        path = ForecastStore.dataset_path(clave)
+        acotado = OutOfCoreTrainer.num_rows(path) > Config.OOC_MAX_ROWS_IN_MEMORY
+        if acotado:
+            df = None
+            stats = OutOfCoreTrainer.dataset_stats(path)
+            articulos_dataset = [a for a in stats.index if a != "Todos"]
+        else:
+            df = ForecastStore.load_dataset(clave)
+            articulos_dataset = [str(a) for a in df['articulo'].dropna().unique()] if 'articulo' in df.columns else []
+
+        if grupos is None:
+            grupos = {"Todos": ["Todos"]}
+            grupos.update({a: [a] for a in articulos_dataset})
+
+        mejores = ModelTuner.load_best(clave)
+        limite = time.monotonic() + presupuesto_s
+        n_procesos = n_procesos or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_procesos) as pool:
+            for n, (grupo, articulos) in enumerate(grupos.items()):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    print(f"[{clave}] presupuesto agotado antes de '{grupo}'")
+                    break
+
+                if acotado:
+                    n_grupo = int(sum(stats.loc[a, 'n'] for a in articulos if a in stats.index))
+                    df_grupo = pd.concat([OutOfCoreTrainer.sample(path, a, Config.OOC_SAMPLE_ROWS, n_grupo)
+                                          for a in articulos], ignore_index=True)
+                    X, y = ModelTuner.build_features(df_grupo, articulos)
+                else:
+                    X, y = ModelTuner.build_features(df, articulos)
+                mejor = ModelTuner.successive_halving(X, y, presupuesto_s=restante / (len(grupos) - n),
+                                                      n_procesos=n_procesos, pool=pool)
+                if mejor is None:
+                    print(f"[{clave}] {grupo}: sin resultado (datos insuficientes o sin tiempo)")
+                    continue
+
+                mejor['ajustado_en'] = pd.Timestamp.now().isoformat()
+                mejor['grupo'] = grupo
+                for articulo in articulos:
+                    # Una búsqueda incompleta no reemplaza a una que llegó a la última ronda
+                    if not mejor['completo'] and mejores.get(articulo, {}).get('completo'):
+                        continue
+                    mejores[articulo] = mejor
+                estado = "" if mejor['completo'] else f" (incompleto: elegido con {mejor['arboles_evaluados']} árboles)"
+                print(f"[{clave}] {grupo}: {mejor['modelo']} {mejor['params']} MAE={mejor['mae']:.2f}{estado}")
+
+        ModelTuner.save_best(clave, mejores)
+        return mejores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajuste de hiperparámetros por artículo")
+    parser.add_argument('--dataset', action='append', help="Clave del dataset (repetible)")
+    parser.add_argument('--presupuesto', type=float, default=Config.TUNING_BUDGET_SECONDS,
+                        help="Presupuesto de reloj por dataset en segundos")
+    parser.add_argument('--grupos', help="JSON {grupo: [articulos]} para ajustar grupos de artículos "
+                                         "en lugar de uno por artículo")
+    args = parser.parse_args()
+
+    grupos = None
+    if args.grupos:
+        with open(args.grupos, encoding='utf-8') as f:
+            grupos = {str(g): [str(a) for a in articulos] for g, articulos in json.load(f).items()}
+
+    for clave in args.dataset or ForecastStore.list_datasets():
+        ModelTuner.tune_dataset(clave, grupos=grupos, presupuesto_s=args.presupuesto)
+
+
+if __name__ == "__main__":
+    main()
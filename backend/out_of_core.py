@@ -0,0 +1,267 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np
+import streamlit as st
+from typing import Dict, Optional, Any, Iterator, List
+
+from backend.ml_predictor import MLPredictor
+from backend.intermittent import IntermittentForecaster
+from backend.utils.config import Config
+
+
+class OutOfCoreTrainer:
+    """
+    Entrenamiento con memoria acotada a partir del Parquet de un dataset registrado
+
+    Nunca se materializa el histórico completo: se recorre el archivo por lotes de
+    OOC_BATCH_ROWS filas y cada grupo de árboles se entrena con su propia muestra
+    aleatoria de como mucho OOC_SAMPLE_ROWS filas (warm_start + max_samples).
+
+    Los Parquet se guardan ordenados por artículo (ver sort_by_article): las estadísticas
+    min/max de cada row group permiten leer solo los del artículo pedido.
+    """
+
+    COLUMNAS = ['fecha', 'articulo', 'demanda']
+
+    # Caché en memoria: ruta del parquet -> (mtime, estadísticas por artículo / eje de fechas)
+    _stats_cache: Dict[str, Any] = {}
+    _fechas_cache: Dict[str, Any] = {}
+
+    @staticmethod
+    def _row_groups(archivo, articulo: str) -> List[int]:
+        """Row groups cuyo rango [min, max] de 'articulo' puede contener el artículo"""
+        columna = archivo.schema_arrow.get_field_index('articulo')
+        grupos = []
+        for i in range(archivo.metadata.num_row_groups):
+            estadisticas = archivo.metadata.row_group(i).column(columna).statistics
+            if estadisticas is None or not estadisticas.has_min_max \
+                    or estadisticas.min <= str(articulo) <= estadisticas.max:
+                grupos.append(i)
+        return grupos
+
+    @staticmethod
+    def _batches(path: str, articulo: str = "Todos") -> Iterator[pd.DataFrame]:
+        import pyarrow.parquet as pq
+
+        archivo = pq.ParquetFile(path)
+        columnas = [c for c in OutOfCoreTrainer.COLUMNAS if c in archivo.schema_arrow.names]
+        grupos = None
+        if articulo != "Todos" and 'articulo' in columnas:
+            grupos = OutOfCoreTrainer._row_groups(archivo, articulo)
+            if not grupos:
+                return
+        for lote in archivo.iter_batches(batch_size=Config.OOC_BATCH_ROWS, row_groups=grupos, columns=columnas):
+            df = lote.to_pandas()
+            if articulo != "Todos" and 'articulo' in df.columns:
+                df = df[df['articulo'] == str(articulo)]
+            yield df
+
+    @staticmethod
+    def num_rows(path: str) -> int:
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    @staticmethod
+    def sort_by_article(origen: str, destino: str) -> None:
+        """
+        Reescribe un Parquet ordenado por artículo y fecha, con memoria acotada
+
+        Las filas se reparten en tramos de artículos consecutivos de unas OOC_BATCH_ROWS
+        filas (un archivo temporal por tramo) y cada tramo se ordena en memoria. Un artículo
+        con más filas que eso forma su propio tramo y se copia por lotes sin ordenar.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        archivo = pq.ParquetFile(origen)
+        esquema = archivo.schema_arrow
+
+        # Primera pasada (solo la columna de artículo): filas por artículo
+        conteos = pd.Series(dtype='int64')
+        for lote in archivo.iter_batches(batch_size=Config.OOC_BATCH_ROWS, columns=['articulo']):
+            conteos = conteos.add(lote.column(0).to_pandas().value_counts(), fill_value=0)
+        conteos = conteos.sort_index()
+
+        tramo_de = {}
+        tramos = [[]]
+        filas = 0
+        for articulo, n in conteos.items():
+            if filas and filas + n > Config.OOC_BATCH_ROWS:
+                tramos.append([])
+                filas = 0
+            tramo_de[articulo] = len(tramos) - 1
+            tramos[-1].append(articulo)
+            filas += n
+
+        # Segunda pasada: reparto en tramos
+        directorio = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(destino)))
+        escritores = {}
+        try:
+            try:
+                for lote in archivo.iter_batches(batch_size=Config.OOC_BATCH_ROWS):
+                    tabla = pa.Table.from_batches([lote], schema=esquema)
+                    ids = tabla.column('articulo').to_pandas().map(tramo_de).to_numpy()
+                    for t in np.unique(ids):
+                        if t not in escritores:
+                            escritores[t] = pq.ParquetWriter(os.path.join(directorio, f"{t}.parquet"), esquema)
+                        escritores[t].write_table(tabla.filter(pa.array(ids == t)))
+            finally:
+                for escritor in escritores.values():
+                    escritor.close()
+
+            # Tramos en orden: cada uno queda en row groups con rangos de artículos disjuntos
+            salida = pq.ParquetWriter(destino, esquema)
+            try:
+                for t, articulos in enumerate(tramos):
+                    ruta = os.path.join(directorio, f"{t}.parquet")
+                    if len(articulos) == 1:
+                        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=Config.OOC_BATCH_ROWS):
+                            salida.write_table(pa.Table.from_batches([lote], schema=esquema))
+                    else:
+                        tabla = pq.read_table(ruta).sort_by([('articulo', 'ascending'), ('fecha', 'ascending')])
+                        salida.write_table(tabla.cast(esquema))
+            finally:
+                salida.close()
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    @staticmethod
+    def dataset_stats(path: str) -> pd.DataFrame:
+        """Una pasada: filas, última fecha y demanda total por artículo (más 'Todos')"""
+        mtime = os.path.getmtime(path)
+        cached = OutOfCoreTrainer._stats_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        # Agregado acumulado: la memoria depende del número de artículos, no de lotes
+        combinar = {'n': 'sum', 'ultima_fecha': 'max', 'suma': 'sum'}
+        stats = None
+        for df in OutOfCoreTrainer._batches(path):
+            if 'articulo' not in df.columns:
+                df = df.assign(articulo="Todos")
+            parcial = df.groupby('articulo').agg(n=('demanda', 'size'), ultima_fecha=('fecha', 'max'),
+                                                 suma=('demanda', 'sum'))
+            stats = parcial if stats is None else pd.concat([stats, parcial]).groupby(level=0).agg(combinar)
+
+        if "Todos" not in stats.index:
+            stats.loc["Todos"] = [stats['n'].sum(), stats['ultima_fecha'].max(), stats['suma'].sum()]
+        OutOfCoreTrainer._stats_cache[path] = (mtime, stats)
+        return stats
+
+    @staticmethod
+    def dataset_dates(path: str) -> np.ndarray:
+        """Eje temporal del dataset (fechas normalizadas con registros), leyendo solo la columna fecha"""
+        import pyarrow.parquet as pq
+
+        mtime = os.path.getmtime(path)
+        cached = OutOfCoreTrainer._fechas_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        fechas = set()
+        for lote in pq.ParquetFile(path).iter_batches(batch_size=Config.OOC_BATCH_ROWS, columns=['fecha']):
+            fechas.update(pd.to_datetime(lote.column(0).to_pandas()).dt.normalize().dropna().unique())
+        eje = np.sort(np.array(list(fechas), dtype='datetime64[ns]'))
+        OutOfCoreTrainer._fechas_cache[path] = (mtime, eje)
+        return eje
+
+    @staticmethod
+    def daily_demand(path: str, articulo: str) -> pd.DataFrame:
+        """Demanda diaria de un artículo (agregado acumulado: memoria proporcional a las fechas)"""
+        diaria = None
+        for df in OutOfCoreTrainer._batches(path, articulo):
+            parcial = df.groupby(pd.to_datetime(df['fecha']).dt.normalize())['demanda'].sum()
+            diaria = parcial if diaria is None else diaria.add(parcial, fill_value=0)
+        if diaria is None:
+            return pd.DataFrame(columns=OutOfCoreTrainer.COLUMNAS)
+        return pd.DataFrame({'fecha': diaria.index, 'articulo': str(articulo), 'demanda': diaria.values})
+
+    @staticmethod
+    def sample(path: str, articulo: str, n_filas: int, n_total: int, seed: int = 0) -> pd.DataFrame:
+        """Muestra aleatoria (Bernoulli por lote) de como mucho n_filas filas del artículo"""
+        rng = np.random.default_rng(seed)
+        tasa = min(1.0, n_filas / max(n_total, 1))
+        partes = [df[rng.random(len(df)) < tasa] for df in OutOfCoreTrainer._batches(path, articulo)]
+        muestra = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=OutOfCoreTrainer.COLUMNAS)
+        if len(muestra) > n_filas:
+            muestra = muestra.sample(n=n_filas, random_state=seed)
+        return muestra.sort_values('fecha').reset_index(drop=True)
+
+    @staticmethod
+    def fit(path: str, articulo: str, n_total: int, modelo_config: Optional[Dict[str, Any]] = None):
+        """
+        Entrena el bosque por grupos de árboles, cada grupo sobre una muestra nueva del disco
+
+        Returns:
+            (modelo, muestra del último grupo) - la muestra sirve como histórico para mostrar
+        """
+        config = modelo_config or MLPredictor.CONFIG_DEFECTO
+        n_arboles = config['params'].get('n_estimators', 100)
+        grupos = max(1, min(Config.OOC_TREE_GROUPS, n_arboles))
+
+        params = dict(config['params'], bootstrap=True, warm_start=True, n_estimators=0)
+        modelo = None
+        # Si el artículo cabe entero en una muestra se lee una sola vez para todos los grupos
+        cabe = n_total <= Config.OOC_SAMPLE_ROWS
+        muestra = OutOfCoreTrainer.sample(path, articulo, Config.OOC_SAMPLE_ROWS, n_total) if cabe else None
+        for g in range(grupos):
+            if not cabe:
+                muestra = OutOfCoreTrainer.sample(path, articulo, Config.OOC_SAMPLE_ROWS, n_total, seed=g)
+            if len(muestra) < 10:
+                return None, muestra
+
+            params['n_estimators'] = n_arboles * (g + 1) // grupos
+            params['max_samples'] = len(muestra)
+            if modelo is None:
+                modelo = MLPredictor.build_model({'modelo': config['modelo'], 'params': params})
+            else:
+                modelo.set_params(n_estimators=params['n_estimators'], max_samples=params['max_samples'])
+
+            X = MLPredictor.temporal_features(muestra['fecha']).to_numpy(dtype=np.float64)
+            modelo.fit(X, muestra['demanda'].to_numpy(dtype=np.float64))
+
+        return modelo, muestra
+
+    @staticmethod
+    def predict_demand(path: str, articulo: str = "Todos", dias_futuro: int = 30,
+                       modelo_config: Optional[Dict[str, Any]] = None,
+                       stats: Optional[pd.DataFrame] = None,
+                       enrutar_intermitente: bool = True) -> Optional[Dict[str, Any]]:
+        """Igual que MLPredictor.predict_demand pero leyendo el dataset del disco con memoria acotada"""
+        try:
+            stats = stats if stats is not None else OutOfCoreTrainer.dataset_stats(path)
+            if str(articulo) not in stats.index:
+                st.error(f"❌ Artículo '{articulo}' no encontrado en el dataset")
+                return None
+
+            fila = stats.loc[str(articulo)]
+
+            # Artículos de demanda intermitente: Croston/SBA/TSB sobre su demanda diaria
+            if enrutar_intermitente and articulo != "Todos":
+                diaria = OutOfCoreTrainer.daily_demand(path, articulo)
+                clasificacion = IntermittentForecaster.route(diaria, articulo, OutOfCoreTrainer.dataset_dates(path))
+                if clasificacion is not None:
+                    st.info(f"📉 Demanda {clasificacion['clase']} - usando modelo {clasificacion['modelo']}")
+                    return IntermittentForecaster.to_result(diaria, articulo, clasificacion, dias_futuro)
+
+            st.info(f"💾 Entrenamiento acotado: {int(fila['n'])} registros en disco, "
+                    f"muestras de {Config.OOC_SAMPLE_ROWS} filas por grupo de árboles")
+
+            config = modelo_config or MLPredictor.CONFIG_DEFECTO
+            modelo, muestra = OutOfCoreTrainer.fit(path, articulo, int(fila['n']), config)
+            if modelo is None:
+                st.warning(f"⚠️ Pocos datos para entrenar ({len(muestra)} registros)")
+                return None
+
+            resultado = MLPredictor.forecast_from_model(
+                modelo, config, muestra['fecha'].values, muestra['demanda'].values, articulo, dias_futuro,
+                ultima_fecha=fila['ultima_fecha']
+            )
+            resultado['modelo_info'] += " - entrenamiento acotado"
+            return resultado
+
+        except Exception as e:
+            st.error(f"❌ ERROR en entrenamiento acotado: {str(e)}")
+            return None
@@ -12,4 +12,38 @@ class Config:
     
     # Configuración de datos
     ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv'}
-    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
\ No newline at end of file
+    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    
+    # Almacén de predicciones materializadas
+    SHARED_DATA_DIR = os.getenv('SHARED_DATA_DIR', 'shared_data')
+    DATASETS_DIR = os.path.join(SHARED_DATA_DIR, 'datasets')
+    FORECASTS_DIR = os.path.join(SHARED_DATA_DIR, 'forecasts')
+    MODELS_DIR = os.path.join(SHARED_DATA_DIR, 'models')
+    FORECAST_HORIZON_DAYS = int(os.getenv('FORECAST_HORIZON_DAYS', 90))
+    FORECAST_MAX_AGE_HOURS = int(os.getenv('FORECAST_MAX_AGE_HOURS', 36))
+    FORECAST_KEEP_RUNS = int(os.getenv('FORECAST_KEEP_RUNS', 7))
+    
+    # Ajuste de hiperparámetros (successive halving)
+    TUNING_DIR = os.path.join(SHARED_DATA_DIR, 'tuning')
+    TUNING_WINDOWS = int(os.getenv('TUNING_WINDOWS', 3))
+    TUNING_BUDGET_SECONDS = float(os.getenv('TUNING_BUDGET_SECONDS', 300))
+    
+    # Lectura rápida de Excel: columnas a proyectar y caché columnar de archivos ya parseados
+    EXCEL_COLUMNS_REQUIRED = ['fecha', 'demanda']
+    EXCEL_COLUMNS_ARTICLE = ['articulo', 'producto', 'product', 'item', 'sku', 'descripcion', 'nombre']
+    EXCEL_COLUMNS_OPTIONAL = ['precio', 'promocion']
+    CACHE_DIR = os.path.join(SHARED_DATA_DIR, 'cache')
+    CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', 512))  # se descartan primero los menos usados
+    
+    # Control de admisión y entrenamiento con memoria acotada.
+    # Pico de memoria del modo acotado ≈ archivo subido + (OOC_BATCH_ROWS + OOC_SAMPLE_ROWS) filas
+    # de 5 columnas (~100 B/fila, unos 20 MB con los valores por defecto) + el bosque entrenado,
+    # independiente del número total de filas.
+    MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', 1024))
+    PROCESSING_MEMORY_FACTOR = 4  # copias del DataFrame durante DataProcessor y la predicción
+    ADMISSION_SAMPLE_ROWS = 2000
+    OOC_MAX_ROWS_IN_MEMORY = int(os.getenv('OOC_MAX_ROWS_IN_MEMORY', 1_000_000))
+    OOC_BATCH_ROWS = int(os.getenv('OOC_BATCH_ROWS', 100_000))
+    OOC_SAMPLE_ROWS = int(os.getenv('OOC_SAMPLE_ROWS', 100_000))
+    OOC_TREE_GROUPS = 5
+    PREVIEW_MAX_ROWS = 10_000
@@ -0,0 +1,13 @@
+"""
+Ejecución del backend sin servidor de Streamlit (lote nocturno, model_tuning)
+
+Los st.* del backend solo producirían avisos "missing ScriptRunContext"; importar este
+módulo antes que los del backend los silencia.
+"""
+from streamlit import config
+from streamlit.logger import set_log_level
+
+# Streamlit reaplica logger.level al leer su configuración, de forma perezosa en el primer
+# st.*: se fuerza la lectura ahora para que el nivel fijado después no se sobrescriba
+config.get_option('logger.level')
+set_log_level('error')
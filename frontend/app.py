@@ -23,7 +23,7 @@ st.info("🔄 Iniciando aplicación...")
 # Importar componentes
 try:
     from frontend.components.sidebar import render_sidebar
-    from frontend.components.data_display import display_data_preview, display_welcome_message
+    from frontend.components.data_display import display_data_preview, display_welcome_message, display_prediction_results
     st.success("✅ Componentes frontend importados")
 except ImportError as e:
     st.error(f"❌ Error importando componentes: {e}")
@@ -54,6 +54,12 @@ except ImportError as e:
     st.error(f"❌ Error importando MLPredictor: {e}")
     # No paramos la app, solo mostramos error
 
+try:
+    from backend.forecast_store import ForecastStore
+    from backend.out_of_core import OutOfCoreTrainer
+except ImportError as e:
+    st.error(f"❌ Error importando ForecastStore: {e}")
+
 def main():
     """Aplicación principal de Streamlit"""
     
@@ -68,8 +74,21 @@ def main():
     if sidebar_config['uploaded_file'] is not None:
         st.info("🔄 Procesando archivo...")
         
+        # Selección de hojas para libros Excel con más de una hoja
+        hojas = None
+        if sidebar_config['uploaded_file'].name.endswith('.xlsx'):
+            hojas_disponibles = FileHandler.list_excel_sheets(sidebar_config['uploaded_file'])
+            if len(hojas_disponibles) > 1:
+                with st.sidebar:
+                    hojas = st.multiselect(
+                        "Hojas de Excel a cargar:",
+                        options=hojas_disponibles,
+                        default=hojas_disponibles[:1],
+                        help="Varias hojas se leen en paralelo y se concatenan"
+                    )
+        
         # Cargar y procesar archivo
-        df, error = FileHandler.load_file(sidebar_config['uploaded_file'])
+        df, error = FileHandler.load_file(sidebar_config['uploaded_file'], hojas or None)
         
         if error:
             st.error(f"❌ Error al cargar archivo: {error}")
@@ -81,7 +100,70 @@ def main():
             # Actualizar artículos
             st.session_state.unique_articles = file_info['unique_articles']
             
+            # Registrar dataset para el lote nocturno de predicciones
+            # (en modo acotado FileHandler ya lo volcó completo a disco; df es solo una muestra)
+            # La guarda usa la huella del contenido: datos nuevos con el mismo nombre se registran de nuevo
+            dataset_key = ForecastStore.dataset_key(sidebar_config['uploaded_file'].name)
+            dataset_en_disco = df.attrs.get('dataset_en_disco')
+            
+            # En modo acotado df es una muestra: los artículos salen de las estadísticas del Parquet completo
+            stats = None
+            if dataset_en_disco is not None:
+                stats = OutOfCoreTrainer.dataset_stats(dataset_en_disco)
+                st.session_state.unique_articles = ["Todos"] + sorted(a for a in stats.index if a != "Todos")
+            
+            huella = FileHandler._fingerprint(sidebar_config['uploaded_file'].getvalue(), hojas)
+            if dataset_en_disco is None and st.session_state.get('dataset_registrado') != huella:
+                ForecastStore.register_dataset(df, sidebar_config['uploaded_file'].name)
+                st.session_state.dataset_registrado = huella
+            
             display_data_preview(df, file_info)
+            
+            # Predicción ML: primero el almacén materializado, en vivo si falta o está obsoleta
+            if sidebar_config['ejecutar_prediccion_ml']:
+                articulo = sidebar_config['articulo_seleccionado']
+                dias = sidebar_config['dias_prediccion']
+                
+                firma = None
+                if stats is not None:
+                    if str(articulo) in stats.index:
+                        firma = ForecastStore.signature_from_stats(*stats.loc[str(articulo)])
+                
+                resultado = ForecastStore.load_forecast(dataset_key, df, articulo, dias, firma=firma)
+                
+                # Tabla antigua u horizonte mayor: el bosque compacto del lote sirve si los datos no cambiaron
+                if resultado is None:
+                    if articulo == "Todos":
+                        df_articulo = df
+                    elif 'articulo' in df.columns:
+                        df_articulo = df[df['articulo'].astype(str) == str(articulo)]
+                    else:
+                        df_articulo = df.iloc[0:0]
+                    guardado = ForecastStore.load_compact_model(
+                        dataset_key, articulo, firma or ForecastStore.article_signature(df, articulo)
+                    )
+                    if guardado is not None and not df_articulo.empty:
+                        df_articulo = df_articulo.sort_values('fecha')
+                        resultado = MLPredictor.forecast_from_compact(
+                            guardado[0], guardado[1], df_articulo['fecha'].values, df_articulo['demanda'].values,
+                            articulo, dias,
+                            ultima_fecha=stats.loc[str(articulo), 'ultima_fecha'] if firma else None
+                        )
+                        resultado['generado_en'] = pd.Timestamp.now()
+                        resultado['origen'] = 'modelo_guardado'
+                
+                if resultado is None:
+                    st.info("ℹ️ Sin predicción vigente en el almacén - calculando en vivo")
+                    if dataset_en_disco is not None:
+                        resultado = OutOfCoreTrainer.predict_demand(dataset_en_disco, articulo, dias, stats=stats)
+                    else:
+                        resultado = MLPredictor.predict_demand(df, articulo, dias)
+                    if resultado is not None:
+                        resultado['generado_en'] = pd.Timestamp.now()
+                        resultado['origen'] = 'en_vivo'
+                
+                if resultado is not None:
+                    display_prediction_results(resultado)
     else:
         display_welcome_message()
 
@@ -166,4 +166,38 @@ def display_exploratory_analysis(df: pd.DataFrame, file_info: dict):
                 
                 st.line_chart(tendencia_mensual.set_index('año_mes')['demanda'])
             except:
-                st.info("ℹ️ No se pudo generar gráfico de tendencia")
\ No newline at end of file
+                st.info("ℹ️ No se pudo generar gráfico de tendencia")
+
+
+def display_prediction_results(resultado: dict):
+    """Muestra la predicción (del almacén o calculada en vivo) con su antigüedad"""
+    
+    st.subheader(f"🔮 Predicción de Demanda - {resultado['articulo']}")
+    
+    # Antigüedad de la predicción
+    generado_en = resultado.get('generado_en')
+    if resultado.get('origen') == 'almacen' and generado_en is not None:
+        horas = (pd.Timestamp.now() - generado_en).total_seconds() / 3600
+        st.caption(f"⚡ Servida desde el almacén (ejecución {resultado.get('run_id')}) - generada hace {horas:.1f} h")
+    elif resultado.get('origen') == 'modelo_guardado':
+        st.caption("⚡ Calculada con el modelo compacto del último lote (sin reentrenar)")
+    else:
+        st.caption("🔄 Calculada en vivo")
+    
+    historico = pd.DataFrame({
+        'fecha': pd.to_datetime(resultado['fechas_historicas']),
+        'Histórico': resultado['demanda_historica']
+    }).groupby('fecha').sum()
+    prediccion = pd.DataFrame({
+        'fecha': pd.to_datetime(resultado['fechas_futuras']),
+        'Predicción': resultado['predicciones']
+    }).set_index('fecha')
+    
+    for q, valores in resultado.get('dispersion_arboles', {}).items():
+        prediccion[f"Árboles P{round(q * 100)}"] = valores
+    
+    st.line_chart(historico.join(prediccion, how='outer'))
+    st.caption(f"Modelo: {resultado['modelo_info']}")
+    if resultado.get('dispersion_arboles'):
+        st.caption("ℹ️ Las líneas 'Árboles P10/P50/P90' muestran la dispersión entre los árboles del bosque "
+                   "(incertidumbre del modelo); no son un intervalo de predicción de la demanda")